@@ -0,0 +1,133 @@
+import json
+import os
+from calendar import timegm
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+import feedparser
+from loguru import logger
+
+FEED_URL = "https://rss.arxiv.org/atom/{category}"
+FEED_STATE_PATH = os.path.join(".cache", "arxiv_feed_state.json")
+# arXiv 按美东时间发布，RSS feed 在美东午夜左右刷新
+ARXIV_TZ = ZoneInfo("America/New_York")
+
+
+def load_feed_state(path: str = FEED_STATE_PATH) -> dict:
+    """读取各分类上次抓取时的 ETag/Last-Modified"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_feed_state(state: dict, path: str = FEED_STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(state, f)
+
+
+def split_query(query: str) -> list[str]:
+    """把 cs.AI+cs.CV 这类多分类查询拆成单个分类，保持顺序并去重"""
+    return list(dict.fromkeys(c.strip() for c in query.split("+") if c.strip()))
+
+
+def get_announcement_date(feed) -> Optional[str]:
+    """feed 对应的发布日期（美东时间），优先取 feed 的 updated，其次取条目中最新的 published"""
+    parsed = feed.feed.get("updated_parsed")
+    if parsed is None:
+        entry_dates = [e.published_parsed for e in feed.entries if e.get("published_parsed")]
+        parsed = max(entry_dates, default=None)
+    if parsed is None:
+        return None
+    return datetime.fromtimestamp(timegm(parsed), timezone.utc).astimezone(ARXIV_TZ).date().isoformat()
+
+
+def announcement_date(state: dict, categories: list[str]) -> Optional[str]:
+    """这些分类都已刷新到的发布日期，即各分类记录的发布日期中最早的一个"""
+    dates = [state.get(c, {}).get("announced") for c in categories]
+    if None in dates:
+        return None
+    return min(dates, default=None)
+
+
+def expected_announcement_date(now: Optional[datetime] = None) -> str:
+    """下一次 feed 刷新对应的发布日期（美东时间）
+
+    feed 在美东午夜左右刷新，午夜前后轮询时等待的都是新一天的发布，所以美东中午以后取次日。
+    冬令时 04:30 UTC 是美东前一天 23:30，此时等待的仍是次日的发布。
+    """
+    now = (now or datetime.now(timezone.utc)).astimezone(ARXIV_TZ)
+    if now.hour >= 12:
+        now += timedelta(days=1)
+    return now.date().isoformat()
+
+
+def is_new_announcement(announced: Optional[str], committed: Optional[str]) -> bool:
+    """feed 是否已刷新到新的发布：必须严格晚于上次提交的发布日期；没有缓存状态时按当前时间推算"""
+    if announced is None:
+        return False
+    if committed is not None:
+        return announced > committed
+    return announced >= expected_announcement_date()
+
+
+def fetch_category(category: str, validators: dict = None) -> tuple[list[str], dict]:
+    """条件请求单个分类的 feed，返回当日新论文 ID 和新的缓存校验信息
+
+    服务器返回 304 时说明 feed 与上次抓取相同，直接返回空列表。
+    """
+    validators = validators or {}
+    feed = feedparser.parse(
+        FEED_URL.format(category=category),
+        etag=validators.get("etag"),
+        modified=validators.get("modified"),
+    )
+    status = feed.get("status")
+    if status == 304:
+        logger.debug(f"Feed of {category} not modified since last run.")
+        return [], validators
+    # 网络或 HTTP 错误不能当作"今天没有新论文"处理
+    if status is None or not 200 <= status < 400:
+        raise Exception(
+            f"Failed to fetch arXiv feed of {category} (status {status}): {feed.get('bozo_exception')}"
+        )
+    if "Feed error for query" in feed.feed.get("title", ""):
+        raise Exception(f"Invalid ARXIV_QUERY: {category}.")
+    if feed.get("bozo") and len(feed.entries) == 0:
+        raise Exception(f"Failed to parse arXiv feed of {category}: {feed.bozo_exception}")
+    paper_ids = [
+        i.id.removeprefix("oai:arXiv.org:")
+        for i in feed.entries
+        if i.arxiv_announce_type == "new"
+    ]
+    new_validators = {}
+    if announced := get_announcement_date(feed):
+        new_validators["announced"] = announced
+    if feed.get("etag"):
+        new_validators["etag"] = feed.etag
+    if feed.get("modified"):
+        new_validators["modified"] = feed.modified
+    return paper_ids, new_validators
+
+
+def fetch_new_paper_ids(query: str, state: dict = None, max_workers: int = 8) -> list[str]:
+    """并发抓取查询中的所有分类，合并并去除交叉列出的重复 ID
+
+    state 为各分类的缓存校验信息，会被原地更新；调用方在整个流程成功后再持久化。
+    """
+    state = {} if state is None else state
+    categories = split_query(query)
+    with ThreadPoolExecutor(max_workers=min(max_workers, max(len(categories), 1))) as executor:
+        results = list(
+            executor.map(lambda c: fetch_category(c, state.get(c)), categories)
+        )
+    paper_ids = []
+    for category, (ids, validators) in zip(categories, results):
+        logger.debug(f"Found {len(ids)} new papers in {category}.")
+        state[category] = validators
+        paper_ids.extend(ids)
+    return list(dict.fromkeys(paper_ids))
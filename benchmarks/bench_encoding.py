@@ -0,0 +1,65 @@
+"""Throughput of encode_texts against a plain encoder.encode call.
+
+Needs sentence-transformers and the embedding model (downloaded on first run).
+Pass a JSON list of abstracts exported from your library with --abstracts; otherwise
+a synthetic library with mixed lengths and ~10% duplicates is generated:
+
+    python benchmarks/bench_encoding.py --items 10000
+    python benchmarks/bench_encoding.py --abstracts abstracts.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from recommender import encode_texts
+
+VOCAB = ['model', 'learning', 'graph', 'agent', 'data', 'neural', 'language', 'vision',
+         'robust', 'training', 'benchmark', 'reasoning', 'diffusion', 'policy', 'retrieval']
+
+
+def synthetic_abstracts(n: int, duplicate_ratio: float, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    texts = [' '.join(rng.choice(VOCAB) for _ in range(rng.choice([30, 80, 150, 250, 400]))) for _ in range(n)]
+    for i in rng.sample(range(n), int(n * duplicate_ratio)):
+        texts[i] = texts[rng.randrange(n)]
+    return texts
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--abstracts', type=str, help='JSON file with a list of abstracts')
+    parser.add_argument('--items', type=int, default=10_000)
+    parser.add_argument('--duplicates', type=float, default=0.1)
+    parser.add_argument('--model', type=str, default='avsolatorio/GIST-small-Embedding-v0')
+    parser.add_argument('--token_budget', type=int, default=4096)
+    args = parser.parse_args()
+
+    if args.abstracts:
+        with open(args.abstracts) as f:
+            texts = json.load(f)
+    else:
+        texts = synthetic_abstracts(args.items, args.duplicates)
+    encoder = SentenceTransformer(args.model)
+    # warm up so model loading and kernel selection are not timed
+    encoder.encode(texts[:64])
+
+    baseline, t_base = timed(lambda: encoder.encode(texts, normalize_embeddings=True))
+    optimized, t_opt = timed(lambda: encode_texts(encoder, texts, token_budget=args.token_budget))
+    print(f'{len(texts)} texts, {len(set(texts))} distinct')
+    print(f' baseline: {t_base:8.2f}s ({len(texts) / t_base:8.1f} texts/s)')
+    print(f'optimized: {t_opt:8.2f}s ({len(texts) / t_opt:8.1f} texts/s), speedup {t_base / t_opt:.2f}x')
+    print(f'max abs difference: {np.abs(baseline - optimized).max():.2e}')
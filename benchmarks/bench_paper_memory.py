@@ -0,0 +1,101 @@
+"""Peak RSS of holding a day's candidates before and after the compact ArxivPaper record.
+
+Simulates a 2k-candidate day where the top 100 papers get their LaTeX source loaded
+and an article generated. Source text and LLM output are synthetic, so no network
+or model is needed. Each variant runs in its own process:
+
+    python benchmarks/bench_paper_memory.py --candidates 2000 --enriched 100
+"""
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arxiv
+
+import paper
+from paper import ArxivPaper
+
+
+def make_result(i: int, rng: random.Random) -> arxiv.Result:
+    words = lambda n: ' '.join(rng.choice(['model', 'learning', 'graph', 'agent', 'data', 'neural']) + str(rng.randint(0, 999)) for _ in range(n))
+    now = datetime.now(timezone.utc)
+    return arxiv.Result(
+        entry_id=f'http://arxiv.org/abs/2401.{i:05d}v1',
+        title=words(12),
+        summary=words(220),
+        authors=[arxiv.Result.Author(words(2)) for _ in range(rng.randint(2, 12))],
+        published=now,
+        updated=now,
+        categories=['cs.AI', 'cs.LG'],
+        links=[arxiv.Result.Link(f'http://arxiv.org/pdf/2401.{i:05d}v1', title='pdf')],
+    )
+
+
+def make_tex(rng: random.Random, size: int) -> dict[str, str]:
+    files = {f'sec{j}.tex': ''.join(rng.choice('abcdefghij \n') for _ in range(size // 8)) for j in range(8)}
+    files['all'] = ''.join(files.values())
+    return files
+
+
+class FakeLLM:
+    lang = 'English'
+
+    def classify_paper_type(self, title, abstract, content=None):
+        return 'solution'
+
+    def generate(self, messages):
+        return '<p>' + messages[-1]['content'][-2000:] + '</p>'
+
+
+class BaselinePaper:
+    """The previous layout: the wrapped arxiv.Result plus cached tex dict and article."""
+
+    def __init__(self, result: arxiv.Result):
+        self._paper = result
+        self.score = None
+        self.tex = None
+        self.article = None
+
+
+def run(variant: str, n_candidates: int, n_enriched: int, tex_size: int):
+    rng = random.Random(0)
+    results = [make_result(i, rng) for i in range(n_candidates)]
+    if variant == 'baseline':
+        papers = [BaselinePaper(r) for r in results]
+    else:
+        papers = [ArxivPaper(r) for r in results]
+    del results
+    paper.get_llm = lambda: FakeLLM()
+    ArxivPaper.load_tex = lambda self: make_tex(rng, tex_size)
+    for p in papers[:n_enriched]:
+        if variant == 'baseline':
+            p.tex = make_tex(rng, tex_size)
+            p.article = '<p>' + p.tex['all'][-2000:] + '</p>'
+        else:
+            p.article
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--candidates', type=int, default=2000)
+    parser.add_argument('--enriched', type=int, default=100)
+    parser.add_argument('--tex_size', type=int, default=400_000, help='bytes of LaTeX source per enriched paper')
+    parser.add_argument('--variant', choices=['baseline', 'compact'])
+    args = parser.parse_args()
+
+    if args.variant:
+        print(run(args.variant, args.candidates, args.enriched, args.tex_size))
+    else:
+        for variant in ['baseline', 'compact']:
+            out = subprocess.run([sys.executable, __file__, '--variant', variant,
+                                  '--candidates', str(args.candidates), '--enriched', str(args.enriched),
+                                  '--tex_size', str(args.tex_size)], capture_output=True, text=True, check=True)
+            # ru_maxrss is in KiB on Linux
+            print(f'{variant:>8}: peak RSS {int(out.stdout.split()[-1]) / 1024:.1f} MiB')
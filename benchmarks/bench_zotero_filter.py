@@ -0,0 +1,77 @@
+"""Time collection path resolution and ignore filtering on a synthetic Zotero library.
+
+Compares the original per-item implementation with get_collection_paths/filter_corpus
+from main.py. No network is needed:
+
+    python benchmarks/bench_zotero_filter.py --items 50000 --collections 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from tempfile import mkstemp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gitignore_parser import parse_gitignore
+
+from main import filter_corpus, get_collection_paths
+
+
+def make_library(n_items: int, n_collections: int, seed: int = 0) -> tuple[list[dict], list[dict]]:
+    rng = random.Random(seed)
+    collections = []
+    for i in range(n_collections):
+        parent = rng.choice(collections)['key'] if collections and rng.random() < 0.8 else False
+        collections.append({'key': f'C{i:05d}', 'data': {'name': f'topic{i % 97}', 'parentCollection': parent}})
+    corpus = []
+    for i in range(n_items):
+        cols = [c['key'] for c in rng.sample(collections, rng.randint(0, 3))]
+        corpus.append({'key': f'I{i}', 'data': {'collections': cols, 'abstractNote': 'x'}})
+    return collections, corpus
+
+
+def baseline(collections: list[dict], corpus: list[dict], pattern: str) -> list[dict]:
+    collections = {c['key']: c for c in collections}
+
+    def get_collection_path(col_key: str) -> str:
+        if p := collections[col_key]['data']['parentCollection']:
+            return get_collection_path(p) + '/' + collections[col_key]['data']['name']
+        else:
+            return collections[col_key]['data']['name']
+
+    for c in corpus:
+        c['paths'] = [get_collection_path(col) for col in c['data']['collections']]
+    fd, filename = mkstemp()
+    with os.fdopen(fd, 'w') as file:
+        file.write(pattern)
+    matcher = parse_gitignore(filename, base_dir='./')
+    new_corpus = [c for c in corpus if not any(matcher(p) for p in c['paths'])]
+    os.remove(filename)
+    return new_corpus
+
+
+def optimized(collections: list[dict], corpus: list[dict], pattern: str) -> list[dict]:
+    paths = get_collection_paths(collections)
+    for c in corpus:
+        c['paths'] = [paths[col] for col in c['data']['collections']]
+    return filter_corpus(corpus, pattern)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=50_000)
+    parser.add_argument('--collections', type=int, default=2_000)
+    parser.add_argument('--pattern', type=str, default='topic1*\n**/topic42/**\n')
+    args = parser.parse_args()
+
+    collections, corpus = make_library(args.items, args.collections)
+    results = {}
+    for name, fn in [('baseline', baseline), ('optimized', optimized)]:
+        items = [{'key': c['key'], 'data': c['data']} for c in corpus]
+        start = time.perf_counter()
+        kept = fn(collections, items, args.pattern)
+        results[name] = [c['key'] for c in kept]
+        print(f'{name:>9}: {time.perf_counter() - start:8.3f}s, kept {len(kept)} of {len(items)} items')
+    assert results['baseline'] == results['optimized'], 'filtered corpus differs from baseline'
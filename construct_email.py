@@ -2,10 +2,13 @@ from paper import ArxivPaper
 import math
 from tqdm import tqdm
 from email.header import Header
+from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.utils import parseaddr, formataddr
 import smtplib
 import datetime
+import json
+import os
 import time
 from loguru import logger
 
@@ -141,15 +144,13 @@ def get_stars(score:float):
         return '<div class="star-wrapper">'+full_star * full_star_num + half_star * half_star_num + '</div>'
 
 
-def render_email(papers:list[ArxivPaper]):
+def render_blocks(papers:list[ArxivPaper]) -> list[str]:
     parts = []
-    if len(papers) == 0 :
-        return framework.replace('__CONTENT__', get_empty_html())
-    
     for p in tqdm(papers,desc='Rendering Email'):
+        # throttle only papers whose analysis is generated here, precomputed ones render instantly
+        throttle = not p.enriched
         rate = get_stars(p.score)
-        authors = [a.name for a in p.authors[:5]]
-        authors = ', '.join(authors)
+        authors = ', '.join(p.authors[:5])
         if len(p.authors) > 5:
             authors += ', ...'
 
@@ -162,30 +163,171 @@ def render_email(papers:list[ArxivPaper]):
             logger.warning(f"Error getting paper type for {p.arxiv_id}: {e}")
 
         parts.append(get_block_html(p.title, authors, rate, p.arxiv_id, p.article, p.entry_id, p.code_url, paper_type_value))
-        time.sleep(10)
+        if throttle:
+            time.sleep(10)
+    return parts
 
-    content = '<br>' + '</br><br>'.join(parts) + '</br>'
+def wrap_blocks(blocks:list[str]) -> str:
+    content = '<br>' + '</br><br>'.join(blocks) + '</br>'
     return framework.replace('__CONTENT__', content)
 
-def send_email(sender:str, receiver:str, password:str,smtp_server:str,smtp_port:int, html:str,):
-    def _format_addr(s):
-        name, addr = parseaddr(s)
-        return formataddr((Header(name, 'utf-8').encode(), addr))
-
-    msg = MIMEText(html, 'html', 'utf-8')
-    msg['From'] = _format_addr('Arxiv Daily <%s>' % sender)
-    msg['To'] = _format_addr('You <%s>' % receiver)
-    today = datetime.datetime.now().strftime('%Y/%m/%d')
-    msg['Subject'] = Header(f'Daily arXiv {today}', 'utf-8').encode()
-
-    try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-    except Exception as e:
-        logger.warning(f"Failed to use TLS. {e}")
-        logger.warning(f"Try to use SSL.")
-        server = smtplib.SMTP_SSL(smtp_server, smtp_port)
-
-    server.login(sender, password)
-    server.sendmail(sender, [receiver], msg.as_string())
-    server.quit()
+def render_text(papers:list[ArxivPaper]) -> str:
+    # compact text/plain alternative for clients that do not render HTML
+    if len(papers) == 0:
+        return 'No Papers Today. Take a Rest!\n'
+    lines = []
+    for i,p in enumerate(papers,1):
+        authors = ', '.join(p.authors[:5]) + (', ...' if len(p.authors) > 5 else '')
+        lines.append(f'{i}. {p.title}')
+        lines.append(f'   {authors}')
+        lines.append(f'   Relevance: {p.score:.2f}  {p.entry_id}')
+        if p.code_url:
+            lines.append(f'   Code: {p.code_url}')
+        lines.append('')
+    return '\n'.join(lines)
+
+# Gmail clips messages whose HTML exceeds ~102KB, keep each part safely below
+MAX_EMAIL_BYTES = 90_000
+
+def render_email_parts(papers:list[ArxivPaper], max_bytes:int=MAX_EMAIL_BYTES) -> list[tuple[str,str]]:
+    """Render the digest as (html, text) parts, split at paper boundaries so each html stays under max_bytes."""
+    if len(papers) == 0:
+        return [(framework.replace('__CONTENT__', get_empty_html()), render_text(papers))]
+    blocks = render_blocks(papers)
+    base_size = len(wrap_blocks([]).encode())
+    groups = [[]]
+    size = base_size
+    for p,b in zip(papers,blocks):
+        n = len(b.encode()) + len('<br></br>')
+        if groups[-1] and size + n > max_bytes:
+            groups.append([])
+            size = base_size
+        groups[-1].append((p,b))
+        size += n
+    return [(wrap_blocks([b for _,b in g]), render_text([p for p,_ in g])) for g in groups]
+
+SMTP_MODE_CACHE_PATH = os.path.join('.cache', 'smtp_mode.json')
+
+class Mailer:
+    """Keep one authenticated SMTP connection for all messages of a run.
+
+    The TLS mode that worked for a server (STARTTLS or SSL) is remembered in
+    SMTP_MODE_CACHE_PATH, so later runs connect directly without the failing attempt.
+    """
+    def __init__(self, sender:str, password:str, smtp_server:str, smtp_port:int, timeout:float=30):
+        self.sender = sender
+        self.password = password
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        # without a timeout, STARTTLS against an implicit-SSL port waits forever for the greeting
+        self.timeout = timeout
+        self.server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _load_modes(self) -> dict:
+        try:
+            with open(SMTP_MODE_CACHE_PATH) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_mode(self, mode:str=None):
+        modes = self._load_modes()
+        if modes.get(self._server_key) == mode:
+            return
+        if mode is None:
+            modes.pop(self._server_key)
+        else:
+            modes[self._server_key] = mode
+        try:
+            os.makedirs(os.path.dirname(SMTP_MODE_CACHE_PATH), exist_ok=True)
+            with open(SMTP_MODE_CACHE_PATH, 'w') as f:
+                json.dump(modes, f)
+        except OSError as e:
+            logger.debug(f"Failed to cache SMTP mode: {e}")
+
+    @property
+    def _server_key(self) -> str:
+        return f'{self.smtp_server}:{self.smtp_port}'
+
+    def _open(self, mode:str) -> smtplib.SMTP:
+        if mode == 'ssl':
+            return smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, timeout=self.timeout)
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
+        try:
+            server.starttls()
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def connect(self):
+        cached = self._load_modes().get(self._server_key)
+        modes = ['starttls', 'ssl']
+        if cached in modes:
+            # try the mode that worked last time first, but still fall back to the other one
+            modes.remove(cached)
+            modes.insert(0, cached)
+        for mode in modes:
+            try:
+                server = self._open(mode)
+            except Exception as e:
+                logger.warning(f"Failed to connect to {self._server_key} with {mode.upper()}. {e}")
+                error = e
+                continue
+            server.login(self.sender, self.password)
+            self._save_mode(mode)
+            self.server = server
+            return
+        if cached is not None:
+            self._save_mode(None)
+        raise error
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                # quit fails on a dropped connection, release the socket directly
+                self.server.close()
+            self.server = None
+
+    def send(self, receiver:str, subject:str, html:str, text:str=None):
+        def _format_addr(s):
+            name, addr = parseaddr(s)
+            return formataddr((Header(name, 'utf-8').encode(), addr))
+
+        msg = MIMEMultipart('alternative')
+        if text is not None:
+            msg.attach(MIMEText(text, 'plain', 'utf-8'))
+        msg.attach(MIMEText(html, 'html', 'utf-8'))
+        msg['From'] = _format_addr('Arxiv Daily <%s>' % self.sender)
+        msg['To'] = _format_addr('You <%s>' % receiver)
+        msg['Subject'] = Header(subject, 'utf-8').encode()
+
+        if self.server is None:
+            self.connect()
+        try:
+            self.server.sendmail(self.sender, [receiver], msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            # the server may drop idle connections between long renders, reconnect once
+            self.close()
+            self.connect()
+            self.server.sendmail(self.sender, [receiver], msg.as_string())
+
+    def send_digest(self, receivers:list[str], parts:list[tuple[str,str]], subject:str=None):
+        if subject is None:
+            today = datetime.datetime.now().strftime('%Y/%m/%d')
+            subject = f'Daily arXiv {today}'
+        for i,(html,text) in enumerate(parts,1):
+            part_subject = subject if len(parts) == 1 else f'{subject} ({i}/{len(parts)})'
+            for receiver in receivers:
+                self.send(receiver, part_subject, html, text)
+
+def parse_receivers(receiver:str) -> list[str]:
+    return [r.strip() for r in receiver.split(',') if r.strip()]
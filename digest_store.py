@@ -0,0 +1,71 @@
+import os
+import pickle
+import time
+
+from loguru import logger
+
+from paper import ArxivPaper
+from prompts import PROMPT_VERSION
+
+DIGEST_STORE_DIR = os.path.join(".cache", "digests")
+# 超过这个天数仍未发送的结果不再保留，避免缓存无限增长
+MAX_DIGEST_AGE_DAYS = 7
+
+
+def save_digest(label: str, papers: list[ArxivPaper], store_dir: str = DIGEST_STORE_DIR) -> str:
+    """保存预计算完成的论文（含分数、解读与代码链接），先写临时文件再原子替换，避免发送端读到半成品"""
+    os.makedirs(store_dir, exist_ok=True)
+    prune_digests(store_dir)
+    path = os.path.join(store_dir, f"{label}.pkl")
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(
+            {
+                "prompt_version": PROMPT_VERSION,
+                "papers": [p.to_bytes() for p in papers],
+            },
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def load_pending_digests(store_dir: str = DIGEST_STORE_DIR) -> list[tuple[str, list[ArxivPaper]]]:
+    """按日期顺序读取所有尚未发送的预计算结果"""
+    try:
+        names = sorted(n for n in os.listdir(store_dir) if n.endswith(".pkl"))
+    except FileNotFoundError:
+        return []
+    digests = []
+    for name in names:
+        try:
+            with open(os.path.join(store_dir, name), "rb") as f:
+                digest = pickle.load(f)
+            if digest["prompt_version"] != PROMPT_VERSION:
+                logger.warning(
+                    f"Precomputed digest {name} was generated with prompt version {digest['prompt_version']}, current is {PROMPT_VERSION}."
+                )
+            digests.append(
+                (
+                    name.removesuffix(".pkl"),
+                    [ArxivPaper.from_bytes(b) for b in digest["papers"]],
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Failed to load precomputed digest {name}: {e}")
+    return digests
+
+
+def mark_digest_sent(label: str, store_dir: str = DIGEST_STORE_DIR):
+    """发送完成后直接删除，缓存中只保留待发送的结果"""
+    os.remove(os.path.join(store_dir, f"{label}.pkl"))
+
+
+def prune_digests(store_dir: str = DIGEST_STORE_DIR, max_age_days: int = MAX_DIGEST_AGE_DAYS):
+    """删除过期的预计算结果，以及旧版本留下的 .sent 和中断写入留下的 .tmp 文件"""
+    expire = time.time() - max_age_days * 86400
+    for name in os.listdir(store_dir):
+        path = os.path.join(store_dir, name)
+        if not name.endswith(".pkl") or os.path.getmtime(path) < expire:
+            logger.debug(f"Removing stale digest file {name}.")
+            os.remove(path)
@@ -1,12 +1,30 @@
+import threading
 from time import sleep
 
-from llama_cpp import Llama
 from loguru import logger
-from openai import OpenAI
+
+from prompts import PROMPT_VERSION, build_classification_messages
 
 GLOBAL_LLM = None
 
 
+def load_local_llm(**kwargs):
+    """加载本地模型，并记录每次推理实际复用的前缀 token 数"""
+    from llama_cpp import Llama
+
+    class PrefixTrackingLlama(Llama):
+        reused_tokens = None
+
+        def eval(self, tokens):
+            # generate 在第一次 eval 之前已截去与 KV 缓存（或从 LlamaRAMCache 恢复的状态）
+            # 相同的前缀，此时的 n_tokens 就是本次真正复用、无需重新计算的 token 数
+            if self.reused_tokens is None:
+                self.reused_tokens = self.n_tokens
+            super().eval(tokens)
+
+    return PrefixTrackingLlama.from_pretrained(**kwargs)
+
+
 class LLM:
     def __init__(
         self,
@@ -15,21 +33,33 @@ class LLM:
         model: str = None,
         lang: str = "English",
     ):
-        if api_key:
+        # llama_cpp 和 openai 导入较慢，只在真正创建 LLM 时按需导入
+        self.use_api = bool(api_key)
+        if self.use_api:
+            from openai import OpenAI
+
             self.llm = OpenAI(api_key=api_key, base_url=base_url)
         else:
-            self.llm = Llama.from_pretrained(
+            from llama_cpp import LlamaRAMCache
+
+            self.llm = load_local_llm(
                 repo_id="Qwen/Qwen2.5-3B-Instruct-GGUF",
                 filename="qwen2.5-3b-instruct-q4_k_m.gguf",
                 n_ctx=5_000,
                 n_threads=4,
                 verbose=False,
             )
+            # 保存每次推理后的 KV 状态，后续提示词共享静态前缀时直接恢复，跳过前缀计算
+            self.llm.set_cache(LlamaRAMCache(capacity_bytes=1 << 30))
         self.model = model
         self.lang = lang
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        # API 模式下多个线程并发调用 generate，累加 token 计数需要加锁
+        self._usage_lock = threading.Lock()
 
     def generate(self, messages: list[dict]) -> str:
-        if isinstance(self.llm, OpenAI):
+        if self.use_api:
             max_retries = 3
             for attempt in range(max_retries):
                 try:
@@ -42,11 +72,36 @@ class LLM:
                     if attempt == max_retries - 1:
                         raise
                     sleep(3)
+            usage = response.usage
+            if usage is not None:
+                details = getattr(usage, "prompt_tokens_details", None)
+                cached = getattr(details, "cached_tokens", None) or 0
+                self._record_usage(usage.prompt_tokens, cached)
             return response.choices[0].message.content
         else:
+            self.llm.reused_tokens = None
             response = self.llm.create_chat_completion(messages=messages, temperature=0)
+            self._record_usage(
+                response["usage"]["prompt_tokens"], self.llm.reused_tokens or 0
+            )
             return response["choices"][0]["message"]["content"]
 
+    def _record_usage(self, prompt_tokens: int, cached_tokens: int):
+        with self._usage_lock:
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+        logger.debug(
+            f"Prompt tokens: {prompt_tokens}, cached prefix tokens: {cached_tokens}"
+        )
+
+    def log_cache_stats(self):
+        if self.prompt_tokens == 0:
+            return
+        ratio = self.cached_tokens / self.prompt_tokens
+        logger.info(
+            f"LLM prompt tokens: {self.prompt_tokens}, cached prefix tokens: {self.cached_tokens} ({ratio:.1%}), prompt version: {PROMPT_VERSION}."
+        )
+
     def classify_paper_type(
         self, title: str, abstract: str, content: str = None
     ) -> str:
@@ -61,24 +116,7 @@ class LLM:
             str: "solution" 或 "exploratory" 或 "unknown"
         """
         try:
-            # 构建分类提示词
-            classification_prompt = f"""请分析以下论文并将其分类为两种类型之一：
-
-论文标题：{title}
-论文摘要：{abstract}
-
-请判断这篇论文主要属于哪种类型：
-1. 解决方案型：提出新方法、算法、框架或技术解决方案
-2. 探究型：进行实验分析、数据探索、现象研究或理论验证
-
-请只回答一个词：solution 或 exploratory"""
-
-            result = self.generate(
-                [
-                    {"role": "system", "content": "你需要准确判断论文类型。"},
-                    {"role": "user", "content": classification_prompt},
-                ]
-            )
+            result = self.generate(build_classification_messages(title, abstract))
 
             # 解析结果
             result = result.strip().lower()
@@ -2,65 +2,80 @@ import arxiv
 import argparse
 import os
 import sys
+import time
 from dotenv import load_dotenv
 load_dotenv(override=True)
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
-from pyzotero import zotero
-from recommender import rerank_paper
-from construct_email import render_email, send_email
+from construct_email import render_email_parts, Mailer, parse_receivers
 from tqdm import trange,tqdm
 from loguru import logger
 from gitignore_parser import parse_gitignore
 from tempfile import mkstemp
-from paper import ArxivPaper
-from llm import set_global_llm
-import feedparser
+from paper import ArxivPaper, enrich_papers
+from datetime import date, timedelta
+from llm import set_global_llm, get_llm
+from arxiv_feed import announcement_date, expected_announcement_date, is_new_announcement, fetch_new_paper_ids, load_feed_state, save_feed_state, split_query
+from digest_store import save_digest, load_pending_digests, mark_digest_sent
+
+def get_collection_paths(collections:list[dict]) -> dict[str,str]:
+    # build the key -> full path index once; each collection is resolved a single time
+    collections = {c['key']:c for c in collections}
+    paths = {}
+    def get_collection_path(col_key:str) -> str:
+        if col_key in paths:
+            return paths[col_key]
+        data = collections[col_key]['data']
+        if p := data['parentCollection']:
+            path = get_collection_path(p) + '/' + data['name']
+        else:
+            path = data['name']
+        paths[col_key] = sys.intern(path)
+        return paths[col_key]
+    for k in collections:
+        get_collection_path(k)
+    return paths
 
 def get_zotero_corpus(id:str,key:str) -> list[dict]:
+    from pyzotero import zotero
     zot = zotero.Zotero(id, 'user', key)
     collections = zot.everything(zot.collections())
-    collections = {c['key']:c for c in collections}
+    collection_paths = get_collection_paths(collections)
     corpus = zot.everything(zot.items(itemType='conferencePaper || journalArticle || preprint'))
     corpus = [c for c in corpus if c['data']['abstractNote'] != '']
-    def get_collection_path(col_key:str) -> str:
-        if p := collections[col_key]['data']['parentCollection']:
-            return get_collection_path(p) + '/' + collections[col_key]['data']['name']
-        else:
-            return collections[col_key]['data']['name']
     for c in corpus:
-        paths = [get_collection_path(col) for col in c['data']['collections']]
-        c['paths'] = paths
+        c['paths'] = [collection_paths[col] for col in c['data']['collections']]
     return corpus
 
 def filter_corpus(corpus:list[dict], pattern:str) -> list[dict]:
-    _,filename = mkstemp()
-    with open(filename,'w') as file:
+    fd,filename = mkstemp()
+    with os.fdopen(fd,'w') as file:
         file.write(pattern)
     matcher = parse_gitignore(filename,base_dir='./')
-    new_corpus = []
-    for c in corpus:
-        match_results = [matcher(p) for p in c['paths']]
-        if not any(match_results):
-            new_corpus.append(c)
     os.remove(filename)
-    return new_corpus
+    # evaluate the matcher once per collection instead of once per item
+    collection_paths = {}
+    for c in corpus:
+        collection_paths.update(zip(c['data']['collections'], c['paths']))
+    excluded = {k for k,p in collection_paths.items() if matcher(p)}
+    return [c for c in corpus if excluded.isdisjoint(c['data']['collections'])]
 
 
-def get_arxiv_paper(query:str, debug:bool=False) -> list[ArxivPaper]:
+def get_arxiv_paper_by_ids(paper_ids:list[str]) -> list[ArxivPaper]:
+    client = arxiv.Client(num_retries=10,delay_seconds=10)
+    papers = []
+    bar = tqdm(total=len(paper_ids),desc="Retrieving Arxiv papers")
+    for i in range(0,len(paper_ids),50):
+        search = arxiv.Search(id_list=paper_ids[i:i+50])
+        batch = [ArxivPaper(p) for p in client.results(search)]
+        bar.update(len(batch))
+        papers.extend(batch)
+    bar.close()
+    return papers
+
+def get_arxiv_paper(query:str, debug:bool=False, feed_state:dict=None) -> list[ArxivPaper]:
     client = arxiv.Client(num_retries=10,delay_seconds=10)
-    feed = feedparser.parse(f"https://rss.arxiv.org/atom/{query}")
-    if 'Feed error for query' in feed.feed.title:
-        raise Exception(f"Invalid ARXIV_QUERY: {query}.")
     if not debug:
-        papers = []
-        all_paper_ids = [i.id.removeprefix("oai:arXiv.org:") for i in feed.entries if i.arxiv_announce_type == 'new']
-        bar = tqdm(total=len(all_paper_ids),desc="Retrieving Arxiv papers")
-        for i in range(0,len(all_paper_ids),50):
-            search = arxiv.Search(id_list=all_paper_ids[i:i+50])
-            batch = [ArxivPaper(p) for p in client.results(search)]
-            bar.update(len(batch))
-            papers.extend(batch)
-        bar.close()
+        papers = get_arxiv_paper_by_ids(fetch_new_paper_ids(query, feed_state))
 
     else:
         logger.debug("Retrieve 5 arxiv papers regardless of the date.")
@@ -73,6 +88,130 @@ def get_arxiv_paper(query:str, debug:bool=False) -> list[ArxivPaper]:
 
     return papers
 
+def get_arxiv_paper_by_date(query:str, start:date, end:date) -> dict[date,list[ArxivPaper]]:
+    # the RSS feed only covers the latest announcement, so past days go through the search API
+    client = arxiv.Client(num_retries=10,delay_seconds=10)
+    categories = split_query(query)
+    cat_query = ' OR '.join(f'cat:{c}' for c in categories)
+    search = arxiv.Search(query=f"({cat_query}) AND submittedDate:[{start:%Y%m%d}0000 TO {end:%Y%m%d}2359]", sort_by=arxiv.SortCriterion.SubmittedDate)
+    papers = {start + timedelta(days=i):[] for i in range((end - start).days + 1)}
+    for p in tqdm(client.results(search),desc="Retrieving Arxiv papers"):
+        # keep new submissions only, like the 'new' announce type of the feed
+        if not any(p.primary_category == c or p.primary_category.startswith(c + '.') for c in categories):
+            continue
+        day = p.published.date()
+        if day in papers:
+            papers[day].append(ArxivPaper(p))
+    return papers
+
+def load_corpus(args) -> list[dict]:
+    logger.info("Retrieving Zotero corpus...")
+    corpus = get_zotero_corpus(args.zotero_id, args.zotero_key)
+    logger.info(f"Retrieved {len(corpus)} papers from Zotero.")
+    if args.zotero_ignore:
+        logger.info(f"Ignoring papers in:\n {args.zotero_ignore}...")
+        corpus = filter_corpus(corpus, args.zotero_ignore)
+        logger.info(f"Remaining {len(corpus)} papers after filtering.")
+    return corpus
+
+def rank_papers(args, papers:list[ArxivPaper]) -> list[ArxivPaper]:
+    corpus = load_corpus(args)
+    logger.info("Reranking papers...")
+    # sentence_transformers pulls in torch, so only import it once there is something to rank
+    from recommender import rerank_paper
+    papers = rerank_paper(papers, corpus)
+    if args.max_paper_num != -1:
+        papers = papers[:args.max_paper_num]
+    return papers
+
+def set_llm(args):
+    if args.use_llm_api:
+        logger.info("Using OpenAI API as global LLM.")
+        set_global_llm(api_key=args.openai_api_key, base_url=args.openai_api_base, model=args.model_name, lang=args.language)
+    else:
+        logger.info("Using Local LLM as global LLM.")
+        set_global_llm(lang=args.language)
+
+def backfill(args):
+    start = date.fromisoformat(args.backfill_from)
+    end = date.fromisoformat(args.backfill_to) if args.backfill_to else date.today() - timedelta(days=1)
+    logger.info(f"Backfilling digests from {start} to {end}...")
+    days = get_arxiv_paper_by_date(args.arxiv_query, start, end)
+    candidates = [p for papers in days.values() for p in papers]
+    logger.info(f"Retrieved {len(candidates)} papers in {len(days)} days.")
+    if len(candidates) == 0:
+        return
+    corpus = load_corpus(args)
+    logger.info("Reranking papers...")
+    from recommender import rerank_paper
+    # one encoder load and one batched pass over all days against the same corpus snapshot
+    candidates = rerank_paper(candidates, corpus)
+    if args.backfill_merge:
+        digests = {f'{start} ~ {end}': candidates}
+    else:
+        digests = {str(d): sorted(papers,key=lambda x: x.score,reverse=True) for d,papers in days.items() if len(papers) > 0}
+    if args.max_paper_num != -1:
+        digests = {k:papers[:args.max_paper_num] for k,papers in digests.items()}
+    set_llm(args)
+    # a local LLM cannot serve concurrent requests
+    enrich_papers([p for papers in digests.values() for p in papers], max_workers=4 if args.use_llm_api else 1)
+    with Mailer(args.sender, args.sender_password, args.smtp_server, args.smtp_port) as mailer:
+        for label, papers in digests.items():
+            parts = render_email_parts(papers)
+            logger.info(f"Sending email for {label}...")
+            mailer.send_digest(parse_receivers(args.receiver), parts, subject=f'Daily arXiv {label}')
+    get_llm().log_cache_stats()
+
+def precompute(args):
+    # poll until every category's feed shows an announcement newer than the committed one (the feed
+    # refreshes around midnight US Eastern), then do all the heavy work ahead of the send run
+    categories = split_query(args.arxiv_query)
+    feed_state = load_feed_state()
+    committed = announcement_date(feed_state, categories)
+    deadline = time.monotonic() + args.poll_minutes * 60
+    while True:
+        # every poll starts from the last committed state, so papers of a stale feed never mix in
+        poll_state = {c:dict(v) for c,v in feed_state.items()}
+        if args.debug:
+            papers, announced = get_arxiv_paper(args.arxiv_query, args.debug), expected_announcement_date()
+            break
+        paper_ids = fetch_new_paper_ids(args.arxiv_query, poll_state)
+        announced = announcement_date(poll_state, categories)
+        if is_new_announcement(announced, committed):
+            feed_state = poll_state
+            papers = get_arxiv_paper_by_ids(paper_ids)
+            break
+        if time.monotonic() >= deadline:
+            # leave the feed state untouched so the send run can still fall back to the full pipeline
+            logger.info(f"The feed still shows the announcement of {announced}, giving up.")
+            return
+        logger.info(f"The feed still shows the announcement of {announced}. Polling again in 5 minutes...")
+        time.sleep(300)
+    if len(papers) == 0:
+        logger.info("No new papers found. Yesterday maybe a holiday and no one submit their work :). If this is not the case, please check the ARXIV_QUERY.")
+        save_feed_state(feed_state)
+        return
+    papers = rank_papers(args, papers)
+    set_llm(args)
+    enrich_papers(papers, max_workers=4 if args.use_llm_api else 1)
+    path = save_digest(announced, papers)
+    save_feed_state(feed_state)
+    get_llm().log_cache_stats()
+    logger.success(f"Precomputed {len(papers)} papers into {path}.")
+
+def send_pending_digests(args, announced:str) -> bool:
+    # mail every pending digest, including ones left behind by a failed send, and report whether
+    # one of them covers the current announcement; only then the full pipeline can be skipped
+    pending = load_pending_digests()
+    if len(pending) == 0:
+        return False
+    with Mailer(args.sender, args.sender_password, args.smtp_server, args.smtp_port) as mailer:
+        for label, papers in pending:
+            logger.info(f"Sending precomputed digest of {label} with {len(papers)} papers...")
+            parts = render_email_parts(papers)
+            mailer.send_digest(parse_receivers(args.receiver), parts, subject=f'Daily arXiv {label}')
+            mark_digest_sent(label)
+    return announced in {label for label,_ in pending}
 
 
 parser = argparse.ArgumentParser(description='Recommender system for academic papers')
@@ -109,7 +248,7 @@ if __name__ == '__main__':
     add_argument('--smtp_server', type=str, help='SMTP server')
     add_argument('--smtp_port', type=int, help='SMTP port')
     add_argument('--sender', type=str, help='Sender email address')
-    add_argument('--receiver', type=str, help='Receiver email address')
+    add_argument('--receiver', type=str, help='Receiver email address, separate multiple receivers with commas')
     add_argument('--sender_password', type=str, help='Sender email password')
     add_argument(
         "--use_llm_api",
@@ -141,6 +280,11 @@ if __name__ == '__main__':
         help="Language of article summaries",
         default="English",
     )
+    add_argument('--backfill_from', type=str, help='Build digests for past days starting from this date (YYYY-MM-DD)')
+    add_argument('--backfill_to', type=str, help='Last date of the backfill range (YYYY-MM-DD), defaults to yesterday')
+    add_argument('--backfill_merge', type=bool, help='Send one merged digest for the whole backfill range', default=False)
+    add_argument('--mode', type=str, help='full: retrieve, analyse and send in one run; precompute: prepare the digest ahead of time; send: mail the precomputed digest, or run fully if there is none', default='full', choices=['full','precompute','send'])
+    add_argument('--poll_minutes', type=int, help='How long precompute mode keeps polling the feed for the announcement', default=90)
     parser.add_argument('--debug', action='store_true', help='Debug mode')
     args = parser.parse_args()
     assert (
@@ -154,33 +298,46 @@ if __name__ == '__main__':
         logger.remove()
         logger.add(sys.stdout, level="INFO")
 
-    logger.info("Retrieving Zotero corpus...")
-    corpus = get_zotero_corpus(args.zotero_id, args.zotero_key)
-    logger.info(f"Retrieved {len(corpus)} papers from Zotero.")
-    if args.zotero_ignore:
-        logger.info(f"Ignoring papers in:\n {args.zotero_ignore}...")
-        corpus = filter_corpus(corpus, args.zotero_ignore)
-        logger.info(f"Remaining {len(corpus)} papers after filtering.")
+    if args.backfill_from:
+        backfill(args)
+        logger.success("Backfill finished.")
+        exit(0)
+
+    if args.mode == 'precompute':
+        precompute(args)
+        exit(0)
+
+    # check arXiv first: on days without announcements we exit before loading Zotero or any model
     logger.info("Retrieving Arxiv papers...")
-    papers = get_arxiv_paper(args.arxiv_query, args.debug)
+    feed_state = load_feed_state()
+    if args.debug:
+        papers = get_arxiv_paper(args.arxiv_query, args.debug)
+    else:
+        paper_ids = fetch_new_paper_ids(args.arxiv_query, feed_state)
+        if args.mode == 'send':
+            announced = announcement_date(feed_state, split_query(args.arxiv_query))
+            if send_pending_digests(args, announced):
+                save_feed_state(feed_state)
+                logger.success("Email sent successfully! If you don't receive the email, please check the configuration and the junk box.")
+                exit(0)
+            logger.info(f"No precomputed digest of the announcement of {announced} found, running the full pipeline.")
+        papers = get_arxiv_paper_by_ids(paper_ids)
     if len(papers) == 0:
         logger.info("No new papers found. Yesterday maybe a holiday and no one submit their work :). If this is not the case, please check the ARXIV_QUERY.")
         if not args.send_empty:
+          save_feed_state(feed_state)
           exit(0)
     else:
-        logger.info("Reranking papers...")
-        papers = rerank_paper(papers, corpus)
-        if args.max_paper_num != -1:
-            papers = papers[:args.max_paper_num]
-        if args.use_llm_api:
-            logger.info("Using OpenAI API as global LLM.")
-            set_global_llm(api_key=args.openai_api_key, base_url=args.openai_api_base, model=args.model_name, lang=args.language)
-        else:
-            logger.info("Using Local LLM as global LLM.")
-            set_global_llm(lang=args.language)
+        papers = rank_papers(args, papers)
+        set_llm(args)
 
-    html = render_email(papers)
+    parts = render_email_parts(papers)
+    if len(papers) > 0:
+        get_llm().log_cache_stats()
     logger.info("Sending email...")
-    send_email(args.sender, args.receiver, args.sender_password, args.smtp_server, args.smtp_port, html)
+    with Mailer(args.sender, args.sender_password, args.smtp_server, args.smtp_port) as mailer:
+        mailer.send_digest(parse_receivers(args.receiver), parts)
+    # only remember feed validators once the digest is delivered, so a failed run can be retried
+    save_feed_state(feed_state)
     logger.success("Email sent successfully! If you don't receive the email, please check the configuration and the junk box.")
 
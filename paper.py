@@ -1,18 +1,26 @@
+import os
+import pickle
 import re
 import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import ExitStack
+from datetime import datetime
 from enum import Enum
-from functools import cached_property
 from tempfile import TemporaryDirectory
 from typing import Optional
 from urllib.error import HTTPError
+from urllib.request import urlretrieve
 
 import arxiv
 import requests
 from loguru import logger
 from requests.adapters import HTTPAdapter, Retry
+from tqdm import tqdm
 
 from llm import get_llm
+from prompts import build_article_messages
 
 
 class PaperType(Enum):
@@ -23,52 +31,107 @@ class PaperType(Enum):
     UNKNOWN = "unknown"  # 未知类型
 
 
-class ArxivPaper:
-    def __init__(self, paper: arxiv.Result):
-        self._paper = paper
-        self.score = None
-        self._paper_type = None  # 缓存论文类型
+class RateLimiter:
+    """线程安全的最小请求间隔，供并行预生成时的所有线程共享"""
 
-    @property
-    def title(self) -> str:
-        return self._paper.title
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next = 0.0
 
-    @property
-    def summary(self) -> str:
-        return self._paper.summary
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+# arXiv 要求每 3 秒不超过 1 个请求；PapersWithCode 没有公开限额，保守地每秒 1 个
+ARXIV_LIMITER = RateLimiter(3.0)
+PWC_LIMITER = RateLimiter(1.0)
 
-    @property
-    def authors(self) -> list[str]:
-        return self._paper.authors
 
-    @cached_property
-    def arxiv_id(self) -> str:
-        return re.sub(r"v\d+$", "", self._paper.get_short_id())
+class _Unset:
+    """尚未计算的懒加载字段占位符，按引用序列化以保持单例"""
+
+    def __reduce__(self):
+        return "_UNSET"
+
+    def __repr__(self):
+        return "<unset>"
+
+
+_UNSET = _Unset()
+
+
+class ArxivPaper:
+    """精简的论文记录
+
+    只保留流程中用到的字段，不持有 arxiv.Result；论文源码只在生成解读时临时加载，
+    生成完毕即释放。分类、解读和代码链接按需计算并缓存在槽位中。
+    """
+
+    __slots__ = (
+        "arxiv_id",
+        "entry_id",
+        "title",
+        "summary",
+        "authors",
+        "published",
+        "updated",
+        "score",
+        "_paper_type",
+        "_article",
+        "_code_url",
+    )
 
-    @cached_property
-    def entry_id(self) -> str:
+    def __init__(self, paper: arxiv.Result):
+        self.arxiv_id: str = re.sub(r"v\d+$", "", paper.get_short_id())
         # 移除版本号，生成不带版本的链接
-        original_id = self._paper.entry_id
-        # 匹配各种格式中的版本号：v1, v2, v10等
-        return re.sub(r"v\d+$", "", original_id)
+        self.entry_id: str = re.sub(r"v\d+$", "", paper.entry_id)
+        self.title: str = paper.title
+        self.summary: str = paper.summary
+        self.authors: list[str] = [a.name for a in paper.authors]
+        self.published: datetime = paper.published
+        self.updated: datetime = paper.updated
+        self.score: Optional[float] = None
+        self._paper_type = _UNSET
+        self._article = _UNSET
+        self._code_url = _UNSET
+
+    def __getstate__(self) -> tuple:
+        return tuple(getattr(self, k) for k in self.__slots__)
+
+    def __setstate__(self, state: tuple):
+        for k, v in zip(self.__slots__, state):
+            setattr(self, k, v)
+
+    def to_bytes(self) -> bytes:
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ArxivPaper":
+        return pickle.loads(data)
+
+    @property
+    def enriched(self) -> bool:
+        """解读是否已经生成（例如预计算或并行预生成后）"""
+        return self._article is not _UNSET
 
-    @cached_property
+    @property
     def paper_type(self) -> PaperType:
         """识别论文类型：解决方案型或探究型"""
-        if self._paper_type is not None:
+        if self._paper_type is not _UNSET:
             return self._paper_type
 
         try:
             llm = get_llm()
 
-            # 准备论文内容用于分类
-            tex_content = None
-            if self.tex and self.tex.get("all"):
-                tex_content = self.tex.get("all")
-
             # 使用LLM专用分类方法
             classification_result = llm.classify_paper_type(
-                title=self.title, abstract=self.summary, content=tex_content
+                title=self.title, abstract=self.summary
             )
 
             # 根据分类结果设置论文类型
@@ -90,12 +153,18 @@ class ArxivPaper:
 
         return self._paper_type
 
-    @cached_property
+    @property
     def code_url(self) -> Optional[str]:
+        if self._code_url is _UNSET:
+            self._code_url = self._search_code_url()
+        return self._code_url
+
+    def _search_code_url(self) -> Optional[str]:
         s = requests.Session()
         retries = Retry(total=5, backoff_factor=0.1)
         s.mount("https://", HTTPAdapter(max_retries=retries))
         try:
+            PWC_LIMITER.wait()
             paper_list = s.get(
                 f"https://paperswithcode.com/api/v1/papers/?arxiv_id={self.arxiv_id}"
             ).json()
@@ -108,6 +177,7 @@ class ArxivPaper:
         paper_id = paper_list["results"][0]["id"]
 
         try:
+            PWC_LIMITER.wait()
             repo_list = s.get(
                 f"https://paperswithcode.com/api/v1/papers/{paper_id}/repositories/"
             ).json()
@@ -118,14 +188,18 @@ class ArxivPaper:
             return None
         return repo_list["results"][0]["url"]
 
-    @cached_property
-    def tex(self) -> dict[str, str]:
+    def load_tex(self) -> dict[str, str]:
+        """下载并解析论文源码，结果不缓存，由调用方用完即弃"""
         with ExitStack() as stack:
             tmpdirname = stack.enter_context(TemporaryDirectory())
-            # file = self._paper.download_source(dirpath=tmpdirname)
             try:
                 # 尝试下载源文件
-                file = self._paper.download_source(dirpath=tmpdirname)
+                ARXIV_LIMITER.wait()
+                file, _ = urlretrieve(
+                    f"https://arxiv.org/src/{self.arxiv_id}",
+                    # 旧式 ID（如 math/0601001）含有斜杠，不能直接作为文件名
+                    os.path.join(tmpdirname, re.sub(r"[^\w.-]", "_", self.arxiv_id) + ".tar.gz"),
+                )
             except HTTPError as e:
                 # 捕获 HTTP 错误
                 if e.code == 404:
@@ -225,16 +299,22 @@ class ArxivPaper:
                 file_contents["all"] = None
         return file_contents
 
-    @cached_property
+    @property
     def article(self) -> str:
+        if self._article is _UNSET:
+            self._article = self._generate_article()
+        return self._article
+
+    def _generate_article(self) -> str:
         """Generate a detailed article about the paper's key points using the full paper content."""
         full_content = ""
 
         # Get the full paper content
-        if self.tex is not None:
-            content = self.tex.get("all")
+        tex = self.load_tex()
+        if tex is not None:
+            content = tex.get("all")
             if content is None:
-                content = "\n".join(self.tex.values())
+                content = "\n".join(v for v in tex.values() if v)
 
             # Clean up the content
             # Remove citations
@@ -269,6 +349,8 @@ class ArxivPaper:
             content = content.strip()
 
             full_content = content
+        # 源码全文只在此处使用，调用LLM前释放
+        del tex
 
         # If no LaTeX content available, use the abstract
         if not full_content.strip():
@@ -276,98 +358,37 @@ class ArxivPaper:
 
         llm = get_llm()
 
-        # 根据论文类型生成不同格式的摘要
-        paper_type = self.paper_type
-
-        if paper_type == PaperType.SOLUTION_TYPE:
-            # 解决方案型论文的提示词 - 输出HTML格式
-            system_prompt = "请仔细阅读这篇解决方案型论文，并生成HTML格式的结构化摘要，不要输出其他内容。使用简明易懂、易于理解的语言和表达，总字数控制在500字左右。"
-            user_prompt = f"""
-以下是一些对你的知识补充，它可能没用：
-
-<概念解释>
-    Harness Engineering（编排工程）：面向 AI 智能体 Agent 的全链路工程体系，区别于提示词、上下文优化，主打为大模型搭建管控框架。包含工具调度、权限约束、流程编排、结果校验、错误回滚与运行监控，约束模型自主执行边界，把大模型零散能力转化为稳定可审计、可长期运行的自动化业务系统。
-    Skill（技能）：AI Agent可调用的执行技能，是封装好的单一功能单元。包含接口调用、工具操作、数据查询、代码运行等具体能力，附带入参、出参与调用规则。Agent依据任务需求自主选择、串联多项Skill，完成复杂目标，是大模型落地实操的基础执行模块。
-</概念解释>
-
----
-
-请仔细阅读这篇解决方案型论文，并生成HTML格式的结构化摘要，不要输出其他内容。使用简明易懂、易于理解的语言和表达，总字数控制在500字左右。
-以下是你需要解读的论文：
-
-论文标题：{self.title}
-
-论文摘要：{self.summary}
-
-论文完整内容：{full_content}
-
-请生成HTML格式的论文分析，包含以下三部分结构：
-⚠️ 现有方案的缺点
-（填充：解释需要解决的问题，分析当前存在方法或方案的不足）
-💡 新方案的设计理念
-（填充：阐述新方案的核心思想和设计原则）
-🔧 新方案的实现方式
-（填充：说明新方案的具体实现方法和关键技术）
-
-请直接输出HTML代码，在填充部分可以使用合适美观的HTML标签格式组织内容。"""
-
-        elif paper_type == PaperType.EXPLORATORY_TYPE:
-            # 探究型论文的提示词 - 输出HTML格式
-            system_prompt = "请仔细阅读这篇探究型论文，并生成HTML格式的结构化摘要，不要输出其他内容。使用简明易懂、易于理解的语言和表达，总字数控制在400字左右。"
-            user_prompt = f"""
-以下是一些对你的知识补充，它可能没用：
-
-<概念解释>
-    Harness Engineering（编排工程）：面向 AI 智能体 Agent 的全链路工程体系，区别于提示词、上下文优化，主打为大模型搭建管控框架。包含工具调度、权限约束、流程编排、结果校验、错误回滚与运行监控，约束模型自主执行边界，把大模型零散能力转化为稳定可审计、可长期运行的自动化业务系统。
-    Skill（技能）：AI Agent可调用的执行技能，是封装好的单一功能单元。包含接口调用、工具操作、数据查询、代码运行等具体能力，附带入参、出参与调用规则。Agent依据任务需求自主选择、串联多项Skill，完成复杂目标，是大模型落地实操的基础执行模块。
-</概念解释>
-
----
-
-请仔细阅读这篇探究型论文，并生成HTML格式的结构化摘要，不要输出其他内容。使用简明易懂、易于理解的语言和表达，总字数控制在400字左右。
-以下是你需要解读的论文：
-
-论文标题：{self.title}
-
-论文摘要：{self.summary}
-
-论文完整内容：{full_content}
-
-请生成HTML格式的论文分析，包含以下两部分结构：
-🔍 探究的问题
-（填充：描述论文要研究或验证的问题）
-📊 实验结论
-（填充：总结实验结果和发现）
-
-请直接输出HTML代码，在填充部分可以使用合适美观的HTML标签格式组织内容。"""
-
-        else:
-            # 未知类型或回退到HTML格式
-            system_prompt = "请仔细阅读这篇论文，并生成HTML格式的摘要，不要输出其他内容。总字数控制在600字以内。"
-            user_prompt = f"""论文标题：{self.title}
-
-论文摘要：{self.summary}
-
-论文完整内容：{full_content}
-
-请仔细阅读这篇论文，并生成HTML格式的摘要，不要输出其他内容。总字数控制在600字以内。
-请生成HTML格式的论文摘要，遵循以下格式：
-<div style="margin-bottom: 20px;">
-<h3 style="color: #333; font-size: 16px; margin-bottom: 8px;">📄 论文摘要</h3>
-（请在这里生成论文的摘要内容）
-</div>
-
-请使用{llm.lang}输出，并直接输出HTML内容。"""
-
-        article = llm.generate(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ]
+        # 提示词静态前缀在前、论文内容在后，便于复用前缀缓存
+        messages = build_article_messages(
+            self.paper_type.value,
+            title=self.title,
+            summary=self.summary,
+            content=full_content,
+            lang=llm.lang,
         )
+        article = llm.generate(messages=messages)
         return article
 
-    @cached_property
+    @property
     def tldr(self) -> str:
         """Backward compatibility - returns the article content."""
         return self.article
+
+
+def enrich_papers(papers: list[ArxivPaper], max_workers: int = 1):
+    """预先生成论文的分类、解读和代码链接，可在线程池中并行
+
+    本地 LLM 不支持并发推理，此时应保持 max_workers=1。对 arXiv 和 PapersWithCode 的请求
+    由 ARXIV_LIMITER 和 PWC_LIMITER 在所有线程间统一限速。单篇论文失败只记录日志，
+    该论文保持未生成状态，渲染邮件时会再次尝试。
+    """
+
+    def enrich(p: ArxivPaper):
+        try:
+            p.article
+            p.code_url
+        except Exception as e:
+            logger.error(f"Error enriching paper {p.arxiv_id}: {e}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(tqdm(executor.map(enrich, papers), total=len(papers), desc="Enriching papers"))
@@ -0,0 +1,118 @@
+"""LLM提示词模板
+
+所有模板都按照"静态前缀在前、论文内容在后"的顺序组织：系统提示词和用户提示词的
+前半部分在同一次运行中对所有论文完全一致，只有末尾的论文标题、摘要和正文随论文变化。
+这样本地 llama.cpp 可以复用已计算的前缀 KV 状态，云端服务商也能命中 prompt caching。
+
+修改任何模板文本时请同步提升 PROMPT_VERSION。
+"""
+
+PROMPT_VERSION = 2
+
+KNOWLEDGE_BLOCK = """以下是一些对你的知识补充，它可能没用：
+
+<概念解释>
+    Harness Engineering（编排工程）：面向 AI 智能体 Agent 的全链路工程体系，区别于提示词、上下文优化，主打为大模型搭建管控框架。包含工具调度、权限约束、流程编排、结果校验、错误回滚与运行监控，约束模型自主执行边界，把大模型零散能力转化为稳定可审计、可长期运行的自动化业务系统。
+    Skill（技能）：AI Agent可调用的执行技能，是封装好的单一功能单元。包含接口调用、工具操作、数据查询、代码运行等具体能力，附带入参、出参与调用规则。Agent依据任务需求自主选择、串联多项Skill，完成复杂目标，是大模型落地实操的基础执行模块。
+</概念解释>
+
+---
+"""
+
+SOLUTION_SYSTEM = "请仔细阅读这篇解决方案型论文，并生成HTML格式的结构化摘要，不要输出其他内容。使用简明易懂、易于理解的语言和表达，总字数控制在500字左右。"
+SOLUTION_PREFIX = (
+    KNOWLEDGE_BLOCK
+    + """
+请仔细阅读这篇解决方案型论文，并生成HTML格式的结构化摘要，不要输出其他内容。使用简明易懂、易于理解的语言和表达，总字数控制在500字左右。
+
+请生成HTML格式的论文分析，包含以下三部分结构：
+⚠️ 现有方案的缺点
+（填充：解释需要解决的问题，分析当前存在方法或方案的不足）
+💡 新方案的设计理念
+（填充：阐述新方案的核心思想和设计原则）
+🔧 新方案的实现方式
+（填充：说明新方案的具体实现方法和关键技术）
+
+请直接输出HTML代码，在填充部分可以使用合适美观的HTML标签格式组织内容。
+"""
+)
+
+EXPLORATORY_SYSTEM = "请仔细阅读这篇探究型论文，并生成HTML格式的结构化摘要，不要输出其他内容。使用简明易懂、易于理解的语言和表达，总字数控制在400字左右。"
+EXPLORATORY_PREFIX = (
+    KNOWLEDGE_BLOCK
+    + """
+请仔细阅读这篇探究型论文，并生成HTML格式的结构化摘要，不要输出其他内容。使用简明易懂、易于理解的语言和表达，总字数控制在400字左右。
+
+请生成HTML格式的论文分析，包含以下两部分结构：
+🔍 探究的问题
+（填充：描述论文要研究或验证的问题）
+📊 实验结论
+（填充：总结实验结果和发现）
+
+请直接输出HTML代码，在填充部分可以使用合适美观的HTML标签格式组织内容。
+"""
+)
+
+UNKNOWN_SYSTEM = "请仔细阅读这篇论文，并生成HTML格式的摘要，不要输出其他内容。总字数控制在600字以内。"
+UNKNOWN_PREFIX = """请仔细阅读这篇论文，并生成HTML格式的摘要，不要输出其他内容。总字数控制在600字以内。
+请生成HTML格式的论文摘要，遵循以下格式：
+<div style="margin-bottom: 20px;">
+<h3 style="color: #333; font-size: 16px; margin-bottom: 8px;">📄 论文摘要</h3>
+（请在这里生成论文的摘要内容）
+</div>
+
+请使用{lang}输出，并直接输出HTML内容。
+"""
+
+PAPER_BODY = """
+以下是你需要解读的论文：
+
+论文标题：{title}
+
+论文摘要：{summary}
+
+论文完整内容：{content}"""
+
+CLASSIFICATION_SYSTEM = "你需要准确判断论文类型。"
+CLASSIFICATION_PREFIX = """请分析论文并将其分类为两种类型之一：
+1. 解决方案型：提出新方法、算法、框架或技术解决方案
+2. 探究型：进行实验分析、数据探索、现象研究或理论验证
+
+请只回答一个词：solution 或 exploratory
+"""
+CLASSIFICATION_BODY = """
+论文标题：{title}
+论文摘要：{abstract}"""
+
+# 论文类型 -> (系统提示词, 静态用户前缀)
+ARTICLE_TEMPLATES = {
+    "solution": (SOLUTION_SYSTEM, SOLUTION_PREFIX),
+    "exploratory": (EXPLORATORY_SYSTEM, EXPLORATORY_PREFIX),
+    "unknown": (UNKNOWN_SYSTEM, UNKNOWN_PREFIX),
+}
+
+
+def build_article_messages(
+    paper_type: str, title: str, summary: str, content: str, lang: str = "English"
+) -> list[dict]:
+    """构建论文解读的对话消息，静态前缀在前，论文内容在后"""
+    system_prompt, prefix = ARTICLE_TEMPLATES.get(paper_type, ARTICLE_TEMPLATES["unknown"])
+    user_prompt = prefix.format(lang=lang) + PAPER_BODY.format(
+        title=title, summary=summary, content=content
+    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def build_classification_messages(title: str, abstract: str) -> list[dict]:
+    """构建论文类型分类的对话消息"""
+    return [
+        {"role": "system", "content": CLASSIFICATION_SYSTEM},
+        {
+            "role": "user",
+            "content": CLASSIFICATION_PREFIX
+            + CLASSIFICATION_BODY.format(title=title, abstract=abstract),
+        },
+    ]
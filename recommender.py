@@ -1,19 +1,50 @@
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from paper import ArxivPaper
 from datetime import datetime
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+def encode_texts(encoder:'SentenceTransformer', texts:list[str], token_budget:int=4096) -> np.ndarray:
+    # encode each distinct text once (the same paper saved twice, versioned preprints)
+    unique = {}
+    index = np.array([unique.setdefault(t, len(unique)) for t in texts], dtype=int)
+    unique = list(unique)
+    if len(unique) == 0:
+        return np.zeros((0, encoder.get_sentence_embedding_dimension()), dtype=np.float32)
+    # sort by token length so each batch pads to similar lengths, and size batches by padded tokens
+    lengths = [len(ids) for ids in encoder.tokenizer(unique, truncation=True, max_length=encoder.max_seq_length)['input_ids']]
+    order = sorted(range(len(unique)), key=lambda i: lengths[i], reverse=True)
+    batches = [[]]
+    for i in order:
+        # longest text comes first, so the batch width is the length of its first item
+        if batches[-1] and (len(batches[-1]) + 1) * lengths[batches[-1][0]] > token_budget:
+            batches.append([])
+        batches[-1].append(i)
+    feature = np.zeros((len(unique), encoder.get_sentence_embedding_dimension()), dtype=np.float32)
+    for batch in batches:
+        feature[batch] = encoder.encode([unique[i] for i in batch], batch_size=len(batch), normalize_embeddings=True)
+    # scatter back to the original order
+    return feature[index]
+
+def score_candidates(candidate_feature:np.ndarray, corpus_feature:np.ndarray, time_decay_weight:np.ndarray) -> np.ndarray:
+    # cosine similarity is linear in unit embeddings, so the time-weighted sum over the corpus
+    # collapses into one profile vector: sum_i w_i * cos(c, x_i) = c . (sum_i w_i * x_i)
+    profile = time_decay_weight @ corpus_feature # [dim]
+    return candidate_feature @ profile * 10 # [n_candidate]
 
 def rerank_paper(candidate:list[ArxivPaper],corpus:list[dict],model:str='avsolatorio/GIST-small-Embedding-v0') -> list[ArxivPaper]:
+    # sentence_transformers pulls in torch, so it is imported only when there is something to rank
+    from sentence_transformers import SentenceTransformer
     encoder = SentenceTransformer(model)
     #sort corpus by date, from newest to oldest
     corpus = sorted(corpus,key=lambda x: datetime.strptime(x['data']['dateAdded'], '%Y-%m-%dT%H:%M:%SZ'),reverse=True)
     time_decay_weight = 1 / (1 + np.log10(np.arange(len(corpus)) + 1))
     time_decay_weight = time_decay_weight / time_decay_weight.sum()
-    corpus_feature = encoder.encode([paper['data']['abstractNote'] for paper in corpus])
-    candidate_feature = encoder.encode([paper.summary for paper in candidate])
-    sim = encoder.similarity(candidate_feature,corpus_feature) # [n_candidate, n_corpus]
-    scores = (sim * time_decay_weight).sum(axis=1) * 10 # [n_candidate]
+    corpus_feature = encode_texts(encoder, [paper['data']['abstractNote'] for paper in corpus])
+    candidate_feature = encode_texts(encoder, [paper.summary for paper in candidate])
+    scores = score_candidates(candidate_feature, corpus_feature, time_decay_weight)
     for s,c in zip(scores,candidate):
-        c.score = s.item()
+        c.score = float(s)
     candidate = sorted(candidate,key=lambda x: x.score,reverse=True)
-    return candidate
\ No newline at end of file
+    return candidate
@@ -0,0 +1,132 @@
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import arxiv_feed
+from arxiv_feed import (
+    announcement_date,
+    fetch_category,
+    fetch_new_paper_ids,
+    load_feed_state,
+    save_feed_state,
+    split_query,
+)
+
+ENTRY = """
+  <entry>
+    <id>oai:arXiv.org:{id}</id>
+    <title>Paper {id}</title>
+    <arxiv:announce_type>{type}</arxiv:announce_type>
+  </entry>"""
+
+FEEDS = {
+    "cs.AI": [("2401.00001", "new"), ("2401.00002", "new"), ("2401.00009", "replace")],
+    "cs.CV": [("2401.00002", "new"), ("2401.00003", "new"), ("2401.00004", "cross")],
+}
+LAST_MODIFIED = formatdate(0, usegmt=True)
+
+
+def render_feed(category: str) -> bytes:
+    entries = "".join(ENTRY.format(id=i, type=t) for i, t in FEEDS[category])
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom">
+  <title>{category} updates on arXiv.org</title>
+  <updated>2024-01-02T00:00:00-05:00</updated>{entries}
+</feed>""".encode()
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        category = self.path.strip("/")
+        etag = f'"{category}-v1"'
+        FeedHandler.requests.append((category, self.headers.get("If-None-Match")))
+        if category not in FEEDS:
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = render_feed(category)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/atom+xml")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def feed_server(monkeypatch):
+    FeedHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FeedHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(
+        arxiv_feed, "FEED_URL", f"http://127.0.0.1:{server.server_port}/{{category}}"
+    )
+    yield FeedHandler
+    server.shutdown()
+    server.server_close()
+
+
+def test_split_query():
+    assert split_query("cs.AI+cs.CV+cs.AI") == ["cs.AI", "cs.CV"]
+    assert split_query("cs.AI") == ["cs.AI"]
+
+
+def test_fetch_merges_and_deduplicates_cross_listed_ids(feed_server):
+    state = {}
+    ids = fetch_new_paper_ids("cs.AI+cs.CV", state)
+    assert ids == ["2401.00001", "2401.00002", "2401.00003"]
+    assert sorted(c for c, _ in feed_server.requests) == ["cs.AI", "cs.CV"]
+    assert state["cs.AI"] == {
+        "announced": "2024-01-02",
+        "etag": '"cs.AI-v1"',
+        "modified": LAST_MODIFIED,
+    }
+
+
+def test_not_modified_returns_no_papers(feed_server):
+    state = {}
+    fetch_new_paper_ids("cs.AI+cs.CV", state)
+    assert fetch_new_paper_ids("cs.AI+cs.CV", state) == []
+    assert ("cs.AI", '"cs.AI-v1"') in feed_server.requests
+    # validators of a 304 response are kept for the next run
+    assert state["cs.CV"]["etag"] == '"cs.CV-v1"'
+
+
+def test_validators_persist_across_runs(feed_server, tmp_path):
+    path = str(tmp_path / "state" / "feed.json")
+    state = load_feed_state(path)
+    assert state == {}
+    fetch_new_paper_ids("cs.AI", state)
+    save_feed_state(state, path)
+    assert fetch_new_paper_ids("cs.AI", load_feed_state(path)) == []
+
+
+def test_http_error_raises(feed_server):
+    with pytest.raises(Exception):
+        fetch_category("math.XX")
+
+
+def test_network_error_raises(monkeypatch):
+    monkeypatch.setattr(arxiv_feed, "FEED_URL", "http://127.0.0.1:9/{category}")
+    with pytest.raises(Exception):
+        fetch_new_paper_ids("cs.AI", {})
+
+
+def test_announcement_date_waits_for_every_category():
+    state = {"cs.AI": {"announced": "2024-01-02"}, "cs.CV": {"announced": "2024-01-01"}}
+    assert announcement_date(state, ["cs.AI"]) == "2024-01-02"
+    assert announcement_date(state, ["cs.AI", "cs.CV"]) == "2024-01-01"
+    assert announcement_date(state, ["cs.AI", "cs.LG"]) is None
@@ -0,0 +1,198 @@
+import email
+import shutil
+import smtplib
+import socket
+import ssl
+import subprocess
+from email.header import decode_header, make_header
+
+import pytest
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+from aiosmtpd.smtp import AuthResult
+
+import construct_email
+from construct_email import Mailer, render_email_parts
+
+
+class Paper:
+    def __init__(self, i: int, article: str = "<p>analysis</p>"):
+        self.title = f"Paper {i}"
+        self.authors = [f"Author {j}" for j in range(7)]
+        self.score = 7.5
+        self.arxiv_id = f"2401.{i:05d}"
+        self.entry_id = f"http://arxiv.org/abs/2401.{i:05d}"
+        self.article = article
+        self.code_url = "https://github.com/x/y" if i % 2 else None
+        self.paper_type = None
+        self.enriched = True
+
+
+class Collector:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, email.message_from_bytes(envelope.content)))
+        return "250 OK"
+
+
+def authenticator(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=auth_data.login == b"me@example.com" and auth_data.password == b"secret")
+
+
+@pytest.fixture(scope="module")
+def tls_context(tmp_path_factory):
+    if shutil.which("openssl") is None:
+        pytest.skip("openssl is required to create a test certificate")
+    d = tmp_path_factory.mktemp("cert")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+         "-keyout", str(d / "key.pem"), "-out", str(d / "cert.pem")],
+        check=True, capture_output=True,
+    )
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(d / "cert.pem", d / "key.pem")
+    return context
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(tls_context, implicit_ssl: bool):
+    handler = Collector()
+    kwargs = dict(hostname="127.0.0.1", port=free_port(), authenticator=authenticator, auth_require_tls=not implicit_ssl)
+    if implicit_ssl:
+        controller = aiosmtpd_controller.Controller(handler, ssl_context=tls_context, **kwargs)
+    else:
+        controller = aiosmtpd_controller.Controller(handler, tls_context=tls_context, require_starttls=True, **kwargs)
+    controller.start()
+    return controller, handler
+
+
+@pytest.fixture
+def starttls_server(tls_context):
+    controller, handler = start_server(tls_context, implicit_ssl=False)
+    yield controller, handler
+    controller.stop()
+
+
+@pytest.fixture
+def ssl_server(tls_context):
+    controller, handler = start_server(tls_context, implicit_ssl=True)
+    yield controller, handler
+    controller.stop()
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch, tmp_path):
+    monkeypatch.setattr(construct_email, "SMTP_MODE_CACHE_PATH", str(tmp_path / "smtp_mode.json"))
+    connections = []
+    open_connection = Mailer._open
+
+    def counted_open(self, mode):
+        connections.append(mode)
+        return open_connection(self, mode)
+
+    monkeypatch.setattr(Mailer, "_open", counted_open)
+    return connections
+
+
+def mailer(controller, **kwargs) -> Mailer:
+    return Mailer("me@example.com", "secret", "127.0.0.1", controller.port, **kwargs)
+
+
+def subject(msg) -> str:
+    return str(make_header(decode_header(msg["Subject"])))
+
+
+def test_split_at_paper_boundaries():
+    papers = [Paper(i, article="x" * 20_000) for i in range(10)]
+    parts = render_email_parts(papers, max_bytes=50_000)
+    assert len(parts) > 1
+    assert all(len(html.encode()) <= 50_000 for html, _ in parts)
+    assert sum(text.count("Paper ") for _, text in parts) == 10
+    assert "Paper 0" in parts[0][1] and "Paper 9" in parts[-1][1]
+
+
+def test_one_connection_for_all_receivers_and_parts(starttls_server, isolated):
+    controller, handler = starttls_server
+    papers = [Paper(i, article="x" * 20_000) for i in range(10)]
+    parts = render_email_parts(papers, max_bytes=50_000)
+    with mailer(controller) as m:
+        m.send_digest(["a@example.com", "b@example.com"], parts, subject="Daily arXiv 2024/01/02")
+    assert isolated == ["starttls"]
+    assert len(handler.messages) == 2 * len(parts)
+    assert [rcpt for rcpt, _ in handler.messages[:2]] == [["a@example.com"], ["b@example.com"]]
+    subjects = [subject(msg) for _, msg in handler.messages[::2]]
+    assert subjects == [f"Daily arXiv 2024/01/02 ({i}/{len(parts)})" for i in range(1, len(parts) + 1)]
+
+
+def test_single_part_subject_is_not_numbered(starttls_server):
+    controller, handler = starttls_server
+    with mailer(controller) as m:
+        m.send_digest(["a@example.com"], render_email_parts([Paper(1)]), subject="Daily arXiv 2024/01/02")
+    assert subject(handler.messages[0][1]) == "Daily arXiv 2024/01/02"
+
+
+def test_message_is_multipart_alternative(starttls_server):
+    controller, handler = starttls_server
+    with mailer(controller) as m:
+        m.send_digest(["a@example.com"], render_email_parts([Paper(1)]))
+    msg = handler.messages[0][1]
+    assert msg.get_content_type() == "multipart/alternative"
+    plain, html = msg.get_payload()
+    assert plain.get_content_type() == "text/plain"
+    assert html.get_content_type() == "text/html"
+    assert "Paper 1" in plain.get_payload(decode=True).decode()
+    assert "Code: https://github.com/x/y" in plain.get_payload(decode=True).decode()
+
+
+def test_tls_mode_cache(ssl_server, isolated):
+    controller, handler = ssl_server
+    with mailer(controller, timeout=1) as m:
+        m.send_digest(["a@example.com"], render_email_parts([Paper(1)]))
+    # STARTTLS is tried first and falls back to SSL
+    assert isolated == ["starttls", "ssl"]
+    with mailer(controller, timeout=1) as m:
+        m.send_digest(["a@example.com"], render_email_parts([Paper(1)]))
+    # the cached mode connects directly
+    assert isolated == ["starttls", "ssl", "ssl"]
+    assert len(handler.messages) == 2
+
+
+def test_stale_cached_mode_falls_back(starttls_server, isolated, tmp_path):
+    controller, handler = starttls_server
+    (tmp_path / "smtp_mode.json").write_text(f'{{"127.0.0.1:{controller.port}": "ssl"}}')
+    with mailer(controller, timeout=1) as m:
+        m.send_digest(["a@example.com"], render_email_parts([Paper(1)]))
+    assert isolated == ["ssl", "starttls"]
+    assert len(handler.messages) == 1
+    assert "starttls" in (tmp_path / "smtp_mode.json").read_text()
+
+
+def test_dropped_connection_is_closed_before_reconnecting(starttls_server, isolated):
+    controller, handler = starttls_server
+    with mailer(controller) as m:
+        m.connect()
+        dead = m.server
+        closed = []
+        close = dead.close
+
+        def sendmail(*args):
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+
+        def record_close():
+            closed.append(True)
+            close()
+
+        dead.sendmail = sendmail
+        dead.close = record_close
+        m.send_digest(["a@example.com"], render_email_parts([Paper(1)]))
+        assert m.server is not dead
+    assert closed and dead.sock is None
+    assert isolated == ["starttls", "starttls"]
+    assert len(handler.messages) == 1
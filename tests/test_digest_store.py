@@ -0,0 +1,33 @@
+import os
+import time
+
+from digest_store import load_pending_digests, mark_digest_sent, save_digest
+from test_paper import make_paper
+
+
+def test_round_trip_keeps_enrichment(tmp_path):
+    paper = make_paper()
+    paper.score = 7.2
+    paper._article = "<p>analysis</p>"
+    save_digest("2024-01-02", [paper], str(tmp_path))
+    [(label, [loaded])] = load_pending_digests(str(tmp_path))
+    assert label == "2024-01-02"
+    assert loaded.arxiv_id == "2401.00001"
+    assert loaded.score == 7.2
+    assert loaded.enriched and loaded.article == "<p>analysis</p>"
+
+
+def test_sent_digests_are_deleted(tmp_path):
+    save_digest("2024-01-02", [make_paper()], str(tmp_path))
+    mark_digest_sent("2024-01-02", str(tmp_path))
+    assert os.listdir(tmp_path) == []
+    assert load_pending_digests(str(tmp_path)) == []
+
+
+def test_stale_files_are_pruned(tmp_path):
+    save_digest("2024-01-01", [make_paper()], str(tmp_path))
+    old = time.time() - 30 * 86400
+    os.utime(tmp_path / "2024-01-01.pkl", (old, old))
+    (tmp_path / "2023-12-31.sent").write_bytes(b"")
+    save_digest("2024-01-02", [make_paper()], str(tmp_path))
+    assert os.listdir(tmp_path) == ["2024-01-02.pkl"]
@@ -0,0 +1,192 @@
+import json
+import os
+import subprocess
+import sys
+from argparse import Namespace
+from datetime import datetime, timezone
+
+import pytest
+
+import arxiv_feed
+import digest_store
+import main
+import test_arxiv_feed
+from test_arxiv_feed import feed_server
+from test_paper import make_paper
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# seconds from interpreter start to exit on a day without new papers, excluding Python's own startup
+COLD_START_TARGET = 3.0
+HEAVY_MODULES = ["torch", "sentence_transformers", "llama_cpp", "openai", "pyzotero"]
+COLD_START = """
+import json, runpy, sys, time
+start = time.perf_counter()
+import arxiv_feed
+arxiv_feed.FEED_URL = sys.argv[1]
+sys.argv = sys.argv[2:]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+except SystemExit as e:
+    code = e.code
+print(json.dumps({
+    "code": code,
+    "seconds": time.perf_counter() - start,
+    "heavy": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """fake clock for arxiv_feed, advanced by main's sleeps between polls"""
+
+    class FakeDatetime(datetime):
+        current = datetime(2024, 1, 9, 4, 30, tzinfo=timezone.utc)
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.current.astimezone(tz)
+
+    def sleep(seconds):
+        FakeDatetime.current = FakeDatetime.current.fromtimestamp(
+            FakeDatetime.current.timestamp() + seconds, timezone.utc
+        )
+
+    monkeypatch.setattr(arxiv_feed, "datetime", FakeDatetime)
+    monkeypatch.setattr(main.time, "sleep", sleep)
+    return FakeDatetime
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """stub out everything precompute does after polling, recording what it saves"""
+    saved = {}
+    monkeypatch.setattr(main, "get_arxiv_paper_by_ids", lambda ids: list(ids))
+    monkeypatch.setattr(main, "rank_papers", lambda args, papers: papers)
+    monkeypatch.setattr(main, "set_llm", lambda args: None)
+    monkeypatch.setattr(main, "enrich_papers", lambda papers, max_workers: None)
+    monkeypatch.setattr(main, "get_llm", lambda: Namespace(log_cache_stats=lambda: None))
+    monkeypatch.setattr(
+        main, "save_digest", lambda label, papers: saved.setdefault("digest", (label, papers))
+    )
+    monkeypatch.setattr(main, "save_feed_state", lambda state: saved.setdefault("state", state))
+    return saved
+
+
+def serve_feed(monkeypatch, announcements: list[str]):
+    """each poll sees the next announcement date in the list, the last one repeats"""
+    polls = []
+
+    def fetch(query, state):
+        announced = announcements[min(len(polls), len(announcements) - 1)]
+        polls.append(announced)
+        state["cs.AI"] = {"announced": announced}
+        return [f"paper of {announced}"]
+
+    monkeypatch.setattr(main, "fetch_new_paper_ids", fetch)
+    return polls
+
+
+def precompute_args():
+    return Namespace(arxiv_query="cs.AI", debug=False, poll_minutes=90, use_llm_api=False)
+
+
+@pytest.mark.parametrize("committed", [{"cs.AI": {"announced": "2024-01-08"}}, {}])
+def test_precompute_waits_past_the_stale_feed_in_winter(monkeypatch, clock, pipeline, committed):
+    # 04:30 UTC in January is 23:30 of the previous day in New York, before the feed refreshes
+    monkeypatch.setattr(main, "load_feed_state", lambda: committed)
+    polls = serve_feed(monkeypatch, ["2024-01-08", "2024-01-08", "2024-01-09"])
+    main.precompute(precompute_args())
+    assert polls == ["2024-01-08", "2024-01-08", "2024-01-09"]
+    assert pipeline["digest"] == ("2024-01-09", ["paper of 2024-01-09"])
+    assert pipeline["state"] == {"cs.AI": {"announced": "2024-01-09"}}
+
+
+def test_precompute_on_monday_accepts_the_first_announcement_after_friday(monkeypatch, clock, pipeline):
+    clock.current = datetime(2024, 1, 8, 4, 30, tzinfo=timezone.utc)
+    monkeypatch.setattr(main, "load_feed_state", lambda: {"cs.AI": {"announced": "2024-01-05"}})
+    polls = serve_feed(monkeypatch, ["2024-01-05", "2024-01-08"])
+    main.precompute(precompute_args())
+    assert polls == ["2024-01-05", "2024-01-08"]
+    assert pipeline["digest"][0] == "2024-01-08"
+
+
+def test_precompute_gives_up_without_touching_the_state(monkeypatch, clock, pipeline):
+    monkeypatch.setattr(main, "load_feed_state", lambda: {"cs.AI": {"announced": "2024-01-08"}})
+    serve_feed(monkeypatch, ["2024-01-08"])
+    main.precompute(Namespace(arxiv_query="cs.AI", debug=False, poll_minutes=0))
+    assert pipeline == {}
+
+
+def test_expected_announcement_date():
+    winter = datetime(2024, 1, 9, 4, 30, tzinfo=timezone.utc)
+    summer = datetime(2024, 7, 9, 4, 30, tzinfo=timezone.utc)
+    assert arxiv_feed.expected_announcement_date(winter) == "2024-01-09"
+    assert arxiv_feed.expected_announcement_date(summer) == "2024-07-09"
+    assert arxiv_feed.expected_announcement_date(datetime(2024, 1, 9, 15, tzinfo=timezone.utc)) == "2024-01-09"
+
+
+class RecordingMailer:
+    sent = []
+
+    def __init__(self, *args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def send_digest(self, receivers, parts, subject=None):
+        RecordingMailer.sent.append(subject)
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    RecordingMailer.sent = []
+    monkeypatch.setattr(main, "Mailer", RecordingMailer)
+    monkeypatch.setattr(main, "render_email_parts", lambda papers: ["<html></html>"])
+    monkeypatch.setattr(digest_store, "DIGEST_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "load_pending_digests", lambda: digest_store.load_pending_digests(str(tmp_path)))
+    monkeypatch.setattr(main, "mark_digest_sent", lambda label: digest_store.mark_digest_sent(label, str(tmp_path)))
+    return tmp_path
+
+
+def send_args():
+    return Namespace(sender="a@b.c", sender_password="", smtp_server="", smtp_port=0, receiver="d@e.f")
+
+
+def test_send_skips_the_pipeline_only_for_the_current_announcement(store):
+    digest_store.save_digest("2024-01-08", [make_paper()], str(store))
+    digest_store.save_digest("2024-01-09", [make_paper()], str(store))
+    assert main.send_pending_digests(send_args(), "2024-01-09")
+    assert RecordingMailer.sent == ["Daily arXiv 2024-01-08", "Daily arXiv 2024-01-09"]
+    assert digest_store.load_pending_digests(str(store)) == []
+
+
+def test_send_delivers_a_leftover_digest_and_still_runs_the_pipeline(store):
+    # precompute gave up today, yesterday's digest was left behind by a failed send
+    digest_store.save_digest("2024-01-08", [make_paper()], str(store))
+    assert not main.send_pending_digests(send_args(), "2024-01-09")
+    assert RecordingMailer.sent == ["Daily arXiv 2024-01-08"]
+
+
+def test_send_without_pending_digests_runs_the_pipeline(store):
+    assert not main.send_pending_digests(send_args(), "2024-01-09")
+    assert RecordingMailer.sent == []
+
+
+def test_no_papers_run_exits_fast_without_heavy_imports(feed_server, monkeypatch, tmp_path):
+    # a day where the feed only has replacements: the run must exit before Zotero or any model
+    monkeypatch.setitem(test_arxiv_feed.FEEDS, "math.HO", [("2401.00009", "replace")])
+    env = dict(os.environ, PYTHONPATH=ROOT, ARXIV_QUERY="math.HO", MODE="full")
+    result = subprocess.run(
+        [sys.executable, "-c", COLD_START % HEAVY_MODULES, arxiv_feed.FEED_URL, os.path.join(ROOT, "main.py")],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert "No new papers found" in result.stdout
+    assert report["code"] == 0
+    assert report["heavy"] == []
+    assert report["seconds"] < COLD_START_TARGET, report
@@ -0,0 +1,51 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.error import URLError
+
+import arxiv
+
+from paper import ArxivPaper, RateLimiter, enrich_papers
+
+
+def make_paper(short_id: str = "2401.00001v2") -> ArxivPaper:
+    now = datetime.now(timezone.utc)
+    return ArxivPaper(
+        arxiv.Result(
+            entry_id=f"http://arxiv.org/abs/{short_id}",
+            title="Title",
+            summary="Summary",
+            authors=[arxiv.Result.Author("Ada Lovelace")],
+            published=now,
+            updated=now,
+        )
+    )
+
+
+def test_rate_limiter_spaces_calls_across_threads():
+    limiter = RateLimiter(0.05)
+    calls = []
+
+    def call(_):
+        limiter.wait()
+        calls.append(time.monotonic())
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(call, range(6)))
+    calls.sort()
+    assert all(b - a >= 0.045 for a, b in zip(calls, calls[1:]))
+
+
+def test_enrich_papers_survives_a_failing_paper(monkeypatch):
+    def generate_article(self):
+        if self.arxiv_id == "2401.00002":
+            raise URLError("connection reset")
+        return f"<p>{self.arxiv_id}</p>"
+
+    # ArxivPaper uses __slots__, so the methods are patched on the class
+    monkeypatch.setattr(ArxivPaper, "_generate_article", generate_article)
+    monkeypatch.setattr(ArxivPaper, "_search_code_url", lambda self: None)
+    papers = [make_paper(f"2401.0000{i}v1") for i in (1, 2, 3)]
+    enrich_papers(papers, max_workers=2)
+    assert [p.enriched for p in papers] == [True, False, True]
+    assert papers[2].article == "<p>2401.00003</p>"
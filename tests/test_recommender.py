@@ -0,0 +1,127 @@
+import zlib
+
+import numpy as np
+import pytest
+
+from recommender import encode_texts, score_candidates
+
+DIM = 8
+
+
+class StubTokenizer:
+    """one token per word, like a real tokenizer called with truncation"""
+
+    def __call__(self, texts, truncation=False, max_length=None):
+        return {"input_ids": [[0] * min(len(t.split()), max_length) for t in texts]}
+
+
+class StubEncoder:
+    max_seq_length = 12
+
+    def __init__(self):
+        self.tokenizer = StubTokenizer()
+        self.batches = []
+
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+    def encode(self, texts, batch_size, normalize_embeddings):
+        assert normalize_embeddings and batch_size == len(texts)
+        self.batches.append(list(texts))
+        return np.stack([embed(t) for t in texts])
+
+
+def embed(text: str) -> np.ndarray:
+    v = np.random.default_rng(zlib.crc32(text.encode())).standard_normal(DIM)
+    return (v / np.linalg.norm(v)).astype(np.float32)
+
+
+def padded_tokens(encoder: StubEncoder, batch: list[str]) -> int:
+    lengths = encoder.tokenizer(batch, truncation=True, max_length=encoder.max_seq_length)["input_ids"]
+    return len(batch) * max(len(ids) for ids in lengths)
+
+
+TEXTS = [
+    "graph neural networks",
+    "a much longer abstract about diffusion models for image generation",
+    "graph neural networks",
+    "short",
+    "an abstract that is longer than the maximum sequence length of the stub encoder and gets truncated",
+    "attention is all you need",
+    "short",
+    "retrieval augmented generation with long context",
+]
+
+
+def test_duplicates_are_encoded_once():
+    encoder = StubEncoder()
+    encode_texts(encoder, TEXTS, token_budget=20)
+    encoded = [t for batch in encoder.batches for t in batch]
+    assert sorted(encoded) == sorted(set(TEXTS))
+
+
+@pytest.mark.parametrize("token_budget", [10, 20, 64])
+def test_batches_stay_within_the_token_budget(token_budget):
+    encoder = StubEncoder()
+    encode_texts(encoder, TEXTS, token_budget=token_budget)
+    for batch in encoder.batches:
+        # a single text longer than the budget still has to be encoded on its own
+        assert padded_tokens(encoder, batch) <= token_budget or len(batch) == 1
+    if token_budget < encoder.max_seq_length:
+        assert [TEXTS[4]] in encoder.batches
+
+
+def test_output_follows_input_order():
+    feature = encode_texts(StubEncoder(), TEXTS, token_budget=20)
+    assert feature.shape == (len(TEXTS), DIM)
+    np.testing.assert_array_equal(feature, np.stack([embed(t) for t in TEXTS]))
+
+
+def test_empty_input():
+    encoder = StubEncoder()
+    feature = encode_texts(encoder, [])
+    assert feature.shape == (0, DIM)
+    assert encoder.batches == []
+
+
+def unit_vectors(rng: np.random.Generator, n: int, dim: int = 384) -> np.ndarray:
+    v = rng.standard_normal((n, dim))
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def time_decay_weight(n: int) -> np.ndarray:
+    w = 1 / (1 + np.log10(np.arange(n) + 1))
+    return w / w.sum()
+
+
+def weighted_similarity_scores(candidate_feature, corpus_feature, w, similarity) -> np.ndarray:
+    """the scoring before the profile vector: time-weighted sum of encoder.similarity"""
+    sim = similarity(candidate_feature, corpus_feature)  # [n_candidate, n_corpus]
+    return (np.asarray(sim) * w).sum(axis=1) * 10
+
+
+def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return a @ b.T
+
+
+def assert_same_ranking(similarity):
+    rng = np.random.default_rng(0)
+    for n_candidate, n_corpus in [(1, 1), (50, 300), (2000, 5000)]:
+        candidate, corpus = unit_vectors(rng, n_candidate), unit_vectors(rng, n_corpus)
+        w = time_decay_weight(n_corpus)
+        expected = weighted_similarity_scores(candidate, corpus, w, similarity)
+        scores = score_candidates(candidate, corpus, w)
+        np.testing.assert_allclose(scores, expected, rtol=0, atol=1e-9)
+        np.testing.assert_array_equal(np.argsort(-scores, kind="stable"), np.argsort(-expected, kind="stable"))
+
+
+def test_profile_vector_matches_weighted_cosine_similarity():
+    assert_same_ranking(cosine)
+
+
+def test_profile_vector_matches_encoder_similarity():
+    # encoder.similarity with the default cosine similarity function
+    util = pytest.importorskip("sentence_transformers.util")
+    assert_same_ranking(lambda a, b: util.cos_sim(a, b).numpy())